@@ -5,13 +5,98 @@
 
 import streamlit as st
 import os
+import hashlib
 import tempfile
-from src.processor import configure_gemini, analyze_interview, generate_report
+from src.processor import (
+    INLINE_MAX_BYTES,
+    LONG_MEDIA_SECONDS,
+    MODEL_OPTIONS,
+    OUTPUT_KEYS,
+    configure_gemini,
+    compress_media,
+    get_media_duration,
+    upload_file_to_gemini,
+    upload_chunks,
+    analyze_interview_inline,
+    analyze_uploaded_file,
+    analyze_long_interview,
+    load_cached_results,
+    save_cached_results,
+    generate_report,
+)
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Cache lifetime; Gemini File API deletes uploads after 48 hours
+CACHE_TTL = 24 * 60 * 60
+
+# Copy buffer size when spooling uploads to disk
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Output labels shared by the output selector, live preview and result tabs
+SECTION_LABELS = {
+    "summary": "📝 纪要 / Summary",
+    "mind_map": "🗺️ 框图 / Mind Map",
+    "transcript": "📜 正文 / Transcript",
+}
+PREVIEW_TRANSCRIPT_CHARS = 3000
+
+@st.cache_resource(show_spinner=False)
+def setup_gemini(api_key_hash, _api_key):
+    """每个 API Key 只配置一次 Gemini / Configure Gemini once per API key (keyed by its hash)."""
+    configure_gemini(_api_key)
+
+def spool_to_tempfile(uploaded_file):
+    """分块写入临时文件 / Spool the upload to a temp file in COPY_CHUNK_SIZE chunks."""
+    uploaded_file.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=f".{uploaded_file.name.split('.')[-1]}") as tmp_file:
+        for chunk in iter(lambda: uploaded_file.read(COPY_CHUNK_SIZE), b""):
+            tmp_file.write(chunk)
+    return tmp_file.name
+
+@st.cache_resource(ttl=CACHE_TTL, show_spinner=False)
+def get_gemini_file(file_sha256, mime_type, _file_path):
+    """按文件内容哈希缓存 File API 句柄 / Cache the File API handle by content hash."""
+    upload_path = compress_media(_file_path, mime_type)
+    try:
+        if upload_path != _file_path:
+            original_kb = os.path.getsize(_file_path) / 1024
+            compressed_kb = os.path.getsize(upload_path) / 1024
+            st.caption(f"📦 已压缩上传 / Compressed for upload: {original_kb:.1f} KB → {compressed_kb:.1f} KB")
+        return upload_file_to_gemini(upload_path)
+    finally:
+        if upload_path != _file_path and os.path.exists(upload_path):
+            os.unlink(upload_path)
+
+@st.cache_resource(ttl=CACHE_TTL, show_spinner=False)
+def get_gemini_chunks(file_sha256, duration, _file_path):
+    """按文件内容哈希缓存长音视频的分段上传 / Cache the uploaded chunks of a long recording by content hash."""
+    return upload_chunks(_file_path, duration=duration)
+
+def get_analysis(file_sha256, mime_type, language, model_name, file_path, on_progress=None, sections=OUTPUT_KEYS,
+                 transcript=None, duration=None):
+    """分析大文件或长音视频：长音视频分段转录，其余复用缓存的 File API 句柄 / Analyze a large or long file (chunked or via the cached upload)."""
+    if mime_type.startswith(("audio", "video")):
+        duration = duration or get_media_duration(file_path)
+        if duration and duration > LONG_MEDIA_SECONDS:
+            # Long recordings: transcribe overlapping chunks in parallel; the chunk uploads
+            # are cached so language / model switches only re-run the LLM, and a cached
+            # transcript skips chunking altogether
+            return analyze_long_interview(
+                file_path, language=language, duration=duration, model_name=model_name, on_progress=on_progress,
+                sections=sections, transcript=transcript,
+                chunk_files=None if transcript else get_gemini_chunks(file_sha256, duration, file_path)
+            )
+    return analyze_uploaded_file(
+        get_gemini_file(file_sha256, mime_type, file_path),
+        language=language,
+        model_name=model_name,
+        on_progress=on_progress,
+        sections=sections,
+    )
+
 # Page Configuration
 st.set_page_config(
     page_title="访谈总结器 | Interview Summarizer",
@@ -73,7 +158,7 @@ with st.sidebar:
     
     if api_key:
         try:
-            configure_gemini(api_key)
+            setup_gemini(hashlib.sha256(api_key.encode()).hexdigest(), api_key)
             st.success("✅ API 已配置 (从环境变量读取)")
         except Exception as e:
             st.error(f"❌ 配置失败: {e}")
@@ -92,6 +177,24 @@ with st.sidebar:
         horizontal=True
     )
     
+    # Model Selection - smallest tier first; upgrade for harder recordings
+    model_tier = st.selectbox(
+        "模型质量 / Model Quality",
+        options=list(MODEL_OPTIONS),
+        format_func=lambda x: {"fast": "⚡ 快速 / Fast", "balanced": "⚖️ 均衡 / Balanced", "best": "🏆 最佳 / Best"}[x],
+        help="快速档速度最快、成本最低；音质较差或内容复杂时可升级"
+    )
+    model_name = MODEL_OPTIONS[model_tier]
+    
+    # Output Selection - unselected outputs are never generated
+    sections = st.multiselect(
+        "输出内容 / Outputs",
+        options=list(SECTION_LABELS),
+        default=list(SECTION_LABELS),
+        format_func=SECTION_LABELS.get,
+        help="只生成所选内容；之后再选其他内容时，已生成的部分直接复用缓存"
+    )
+    
     st.markdown("---")
     st.info("""
     **支持格式 / Supported Formats:**
@@ -101,7 +204,7 @@ with st.sidebar:
     """)
     
     st.markdown("---")
-    st.caption("Powered by **Gemini 1.5 Pro**")
+    st.caption(f"Powered by **{model_name}**")
 
 # Main Content
 col1, col2 = st.columns([1, 1])
@@ -131,25 +234,75 @@ with col2:
     st.subheader("🚀 分析 / Analyze")
     
     if uploaded_file:
-        if st.button("🎯 开始分析 / Start Analysis", type="primary", use_container_width=True):
-            # Save to temp file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f".{uploaded_file.name.split('.')[-1]}") as tmp_file:
-                tmp_file.write(uploaded_file.getvalue())
-                tmp_file_path = tmp_file.name
-            
+        if not sections:
+            st.warning("👈 请至少选择一项输出 / Select at least one output")
+        if st.button("🎯 开始分析 / Start Analysis", type="primary", use_container_width=True, disabled=not sections):
+            tmp_file_path = None
             try:
                 with st.spinner("⏳ 正在分析... 这可能需要1-2分钟 / Analyzing..."):
-                    results = analyze_interview(tmp_file_path, language=language)
+                    # Live preview: outputs render as they stream instead of after the full response
+                    live_preview = st.empty()
+                    with live_preview.container():
+                        placeholders = {
+                            key: st.expander(SECTION_LABELS[key], expanded=True).empty() for key in sections
+                        }
+                    
+                    def show_progress(key, text):
+                        if key not in placeholders:
+                            return
+                        if key == "mind_map":
+                            placeholders[key].code(text, language="mermaid")
+                        elif key == "transcript":
+                            # Only the tail, so re-rendering stays cheap for long transcripts
+                            placeholders[key].text(text[-PREVIEW_TRANSCRIPT_CHARS:])
+                        else:
+                            placeholders[key].markdown(text)
+                    
+                    # Content hash is the cache key, so re-clicks / language switches skip the upload;
+                    # hashed zero-copy from the in-memory upload
+                    file_sha256 = hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+                    
+                    # Same file analyzed before (any session, survives restarts): only
+                    # the selected outputs that are not cached yet get generated
+                    results = load_cached_results(file_sha256, language, model_name) or {}
+                    missing = [key for key in sections if not results.get(key)]
+                    if missing:
+                        # Spooled only on a miss, so cache hits never write (possibly GB-sized) temp files.
+                        # Audio / video is always spooled so ffprobe can read its duration: long
+                        # recordings are chunked even when they are small enough to send inline.
+                        is_media = uploaded_file.type.startswith(("audio", "video"))
+                        small = uploaded_file.size < INLINE_MAX_BYTES
+                        if is_media or not small:
+                            tmp_file_path = spool_to_tempfile(uploaded_file)
+                        duration = get_media_duration(tmp_file_path) if is_media else None
+                        if small and not (duration and duration > LONG_MEDIA_SECONDS):
+                            # Small files go inline with the request: no File API upload
+                            generated = analyze_interview_inline(
+                                uploaded_file.getvalue(), uploaded_file.type, language=language,
+                                model_name=model_name, on_progress=show_progress, sections=missing
+                            )
+                        else:
+                            generated = get_analysis(
+                                file_sha256, uploaded_file.type, language, model_name, tmp_file_path,
+                                on_progress=show_progress, sections=missing, transcript=results.get("transcript"),
+                                duration=duration
+                            )
+                        results = {**results, **generated}
+                        save_cached_results(file_sha256, language, results, model_name)
+                    results = {key: results[key] for key in sections}
+                    live_preview.empty()
                 
                 st.success("✅ 分析完成! / Analysis Complete!")
                 st.session_state['results'] = results
                 st.session_state['filename'] = uploaded_file.name.rsplit('.', 1)[0]
+                # Build the report once here rather than on every rerun / tab switch
+                st.session_state['report'] = generate_report(results, st.session_state['filename'])
                 
             except Exception as e:
                 st.error(f"❌ 分析失败: {e}")
             finally:
                 # Cleanup
-                if os.path.exists(tmp_file_path):
+                if tmp_file_path and os.path.exists(tmp_file_path):
                     os.unlink(tmp_file_path)
     else:
         st.info("👆 请先上传文件 / Please upload a file first")
@@ -162,58 +315,58 @@ if 'results' in st.session_state:
     results = st.session_state['results']
     filename = st.session_state.get('filename', 'interview')
     
-    # Tabs for different outputs
-    tab_summary, tab_mindmap, tab_transcript, tab_report = st.tabs([
-        "📝 纪要 / Summary", 
-        "🗺️ 框图 / Mind Map", 
-        "📜 正文 / Transcript",
-        "📋 完整报告 / Full Report"
-    ])
-    
-    with tab_summary:
-        st.markdown("### 访谈纪要 / Interview Summary")
-        st.markdown(results.get("summary", "暂无内容"))
-        st.download_button(
-            "⬇️ 下载纪要",
-            results.get("summary", ""),
-            file_name=f"{filename}_summary.txt",
-            mime="text/plain"
-        )
+    # Tabs for the generated outputs only
+    shown = [key for key in SECTION_LABELS if key in results]
+    tab_labels = [SECTION_LABELS[key] for key in shown] + ["📋 完整报告 / Full Report"]
+    tabs = dict(zip(shown + ["report"], st.tabs(tab_labels)))
+    
+    if "summary" in tabs:
+        with tabs["summary"]:
+            st.markdown("### 访谈纪要 / Interview Summary")
+            st.markdown(results.get("summary", "暂无内容"))
+            st.download_button(
+                "⬇️ 下载纪要",
+                results.get("summary", ""),
+                file_name=f"{filename}_summary.txt",
+                mime="text/plain"
+            )
     
-    with tab_mindmap:
-        st.markdown("### 信息框图 / Mind Map")
-        mermaid_code = results.get("mind_map", "")
+    if "mind_map" in tabs:
+        with tabs["mind_map"]:
+            st.markdown("### 信息框图 / Mind Map")
+            mermaid_code = results.get("mind_map", "")
         
-        # Display Mermaid code
-        st.code(mermaid_code, language="mermaid")
+            # Display Mermaid code
+            st.code(mermaid_code, language="mermaid")
         
-        st.caption("💡 复制上方代码到 [Mermaid Live Editor](https://mermaid.live) 查看可视化效果")
+            st.caption("💡 复制上方代码到 [Mermaid Live Editor](https://mermaid.live) 查看可视化效果")
         
-        st.download_button(
-            "⬇️ 下载框图",
-            mermaid_code,
-            file_name=f"{filename}_mindmap.mmd",
-            mime="text/plain"
-        )
+            st.download_button(
+                "⬇️ 下载框图",
+                mermaid_code,
+                file_name=f"{filename}_mindmap.mmd",
+                mime="text/plain"
+            )
     
-    with tab_transcript:
-        st.markdown("### 访谈正文 / Transcript")
-        st.text_area(
-            "全文转录",
-            results.get("transcript", ""),
-            height=500,
-            label_visibility="collapsed"
-        )
-        st.download_button(
-            "⬇️ 下载正文",
-            results.get("transcript", ""),
-            file_name=f"{filename}_transcript.txt",
-            mime="text/plain"
-        )
+    if "transcript" in tabs:
+        with tabs["transcript"]:
+            st.markdown("### 访谈正文 / Transcript")
+            st.text_area(
+                "全文转录",
+                results.get("transcript", ""),
+                height=500,
+                label_visibility="collapsed"
+            )
+            st.download_button(
+                "⬇️ 下载正文",
+                results.get("transcript", ""),
+                file_name=f"{filename}_transcript.txt",
+                mime="text/plain"
+            )
     
-    with tab_report:
+    with tabs["report"]:
         st.markdown("### 完整报告 / Full Report")
-        report = generate_report(results, filename)
+        report = st.session_state.get('report') or generate_report(results, filename)
         
         st.markdown(report)
         
@@ -230,6 +383,6 @@ st.markdown("---")
 st.markdown("""
 <div style="text-align: center; color: #888;">
     <p>🎙️ 访谈总结器 | Interview Summarizer</p>
-    <p>由 <strong>Gemini 1.5 Pro</strong> 驱动 | Powered by <strong>Gemini 1.5 Pro</strong></p>
+    <p>由 <strong>Gemini 2.5</strong> 驱动 | Powered by <strong>Gemini 2.5</strong></p>
 </div>
 """, unsafe_allow_html=True)
@@ -1,4 +1,30 @@
 # Processor module
-from .processor import configure_gemini, analyze_interview, generate_report
+from .processor import (
+    MODEL_OPTIONS,
+    OUTPUT_KEYS,
+    configure_gemini,
+    compress_media,
+    upload_file_to_gemini,
+    analyze_interview,
+    analyze_interview_inline,
+    analyze_uploaded_file,
+    analyze_long_interview,
+    load_cached_results,
+    save_cached_results,
+    generate_report,
+)
 
-__all__ = ["configure_gemini", "analyze_interview", "generate_report"]
+__all__ = [
+    "MODEL_OPTIONS",
+    "OUTPUT_KEYS",
+    "configure_gemini",
+    "compress_media",
+    "upload_file_to_gemini",
+    "analyze_interview",
+    "analyze_interview_inline",
+    "analyze_uploaded_file",
+    "analyze_long_interview",
+    "load_cached_results",
+    "save_cached_results",
+    "generate_report",
+]
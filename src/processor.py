@@ -1,14 +1,34 @@
 """
 访谈处理模块 - Interview Processor Module
-使用 Gemini 1.5 Pro API 进行多模态分析
+使用 Gemini 2.5 API 进行多模态分析
 """
 
 import os
+import re
+import json
+import math
+import queue
+import threading
 import time
 import logging
+import shutil
+import datetime
+import functools
+import tempfile
+import subprocess
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor, wait
 import google.generativeai as genai
+from google.generativeai import caching
+from google.api_core import exceptions as google_exceptions
 from dotenv import load_dotenv
 
+# Body of a JSON string value, up to its closing quote or the end of a partial response
+JSON_STRING_BODY_RE = re.compile(r'(?:[^"\\]|\\.)*')
+
+# Mermaid code inside a (possibly unterminated) ``` / ```mermaid fence
+MERMAID_FENCE_RE = re.compile(r"```(?:mermaid)?\s*(.*?)(?:```|$)", re.DOTALL)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -16,73 +36,86 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-def configure_gemini(api_key=None):
-    """配置 Gemini API / Configure Gemini API."""
-    key = api_key or os.getenv("GEMINI_API_KEY")
-    if not key:
-        logger.error("No API key provided.")
-        raise ValueError("Gemini API Key is required. / 需要提供 Gemini API 密钥。")
-    genai.configure(api_key=key)
+# Model tiers offered to the user; the smallest adequate tier is the default
+MODEL_OPTIONS = {
+    "fast": "gemini-2.5-flash-lite",
+    "balanced": "gemini-2.5-flash",
+    "best": "gemini-2.5-pro",
+}
+MODEL_NAME = MODEL_OPTIONS["fast"]
 
-def upload_file_to_gemini(file_path):
-    """上传文件到 Gemini File API / Upload file to Gemini File API."""
-    try:
-        logger.info(f"Uploading file: {file_path}")
-        file_upload = genai.upload_file(file_path)
-        logger.info(f"File uploaded. URI: {file_upload.uri}")
-        
-        # Poll for processing completion
-        while file_upload.state.name == "PROCESSING":
-            logger.info("File is processing...")
-            time.sleep(2)
-            file_upload = genai.get_file(file_upload.name)
-            
-        if file_upload.state.name == "FAILED":
-            logger.error("File processing failed.")
-            raise RuntimeError("Gemini File API processing failed. / 文件处理失败。")
-            
-        logger.info(f"File ready. State: {file_upload.state.name}")
-        return file_upload
-    except Exception as e:
-        logger.error(f"Error uploading file: {e}")
-        raise
+# Outputs an analysis can produce; callers may request any subset
+OUTPUT_KEYS = ("transcript", "summary", "mind_map")
 
-def analyze_interview(file_path, language="zh"):
-    """
-    分析访谈内容 / Analyze interview content using Gemini 1.5 Pro.
-    
-    Args:
-        file_path (str): 本地文件路径 / Path to the local file
-        language (str): 输出语言 "zh" 或 "en" / Output language
-        
-    Returns:
-        dict: 包含 'transcript', 'summary', 'mind_map' 的字典
-    """
-    # 1. Upload File
-    uploaded_file = upload_file_to_gemini(file_path)
-    
-    # 2. Select Model (Gemini 2.5 Flash)
-    model = genai.GenerativeModel(model_name="gemini-2.5-flash")
-    
-    # 3. Construct Prompts
-    results = {}
-    
-    # Language-specific instructions
-    if language == "zh":
-        base_instruction = """
+# One structured call for all outputs; set GEMINI_BATCH_PROMPTS=0 to use separate calls
+BATCH_PROMPTS = os.getenv("GEMINI_BATCH_PROMPTS", "1") != "0"
+
+# Lifetime of the server-side context cache shared by the three prompts
+CONTEXT_CACHE_TTL = datetime.timedelta(minutes=10)
+
+# Files below this size are sent inline with the request instead of via the File API.
+# Gemini's 20 MB inline limit covers the whole request, so leave headroom for the prompts.
+INLINE_MAX_BYTES = 19 * 1000 * 1000
+
+# Speech-grade re-encode before upload: mono 16 kHz Opus, video track dropped
+COMPRESS_AUDIO_ARGS = ["-vn", "-ac", "1", "-ar", "16000", "-c:a", "libopus", "-b:a", "24k"]
+
+# Recordings longer than LONG_MEDIA_SECONDS are split into overlapping chunks
+# that are transcribed in parallel (needs ffmpeg / ffprobe)
+LONG_MEDIA_SECONDS = 10 * 60
+CHUNK_SECONDS = 120
+CHUNK_OVERLAP_SECONDS = 5
+MAX_CHUNK_WORKERS = 4
+
+# Persistent results cache shared across sessions and restarts (oldest entries evicted)
+RESULTS_CACHE_DIR = os.getenv("INTERVIEW_CACHE_DIR", ".interview_cache")
+RESULTS_CACHE_MAX_ENTRIES = 200
+
+# File API polling: start fast, back off to POLL_MAX_INTERVAL, give up after MAX_POLL_SECONDS
+POLL_INITIAL_INTERVAL = 0.25
+POLL_BACKOFF = 1.5
+POLL_MAX_INTERVAL = 5.0
+MAX_POLL_SECONDS = 600
+
+# At most this many File API uploads in flight per process (chunk workers, sessions)
+MAX_INFLIGHT_UPLOADS = 4
+UPLOAD_SLOTS = threading.BoundedSemaphore(MAX_INFLIGHT_UPLOADS)
+
+# Finish reasons under which a streamed response is complete and usable
+STREAM_OK_FINISH_REASONS = (
+    genai.protos.Candidate.FinishReason.STOP,
+    genai.protos.Candidate.FinishReason.MAX_TOKENS,
+)
+
+# Retry settings for transient API errors (429 / 5xx)
+MAX_RETRIES = 4
+RETRY_BASE_DELAY = 2.0
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.InternalServerError,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+)
+
+# Prompt templates per output language; built once at import and read-only
+PROMPTS = MappingProxyType({
+    "zh": MappingProxyType({
+        "base": """
         你是一位专业的访谈分析专家，同时也是一位秘书。
         你的任务是分析提供的访谈录音/视频/图片。
         请用中文回复。
-        """
-        transcript_prompt = "生成访谈的逐字稿。区分不同发言人很重要。格式为 '发言人: 内容'。"
-        summary_prompt = """
+        """,
+        "batch": "请在一次回复中完成以下各项任务，以 JSON 对象返回，每个字段（方括号中的名称）为对应任务的完整输出。",
+        "transcript_context": "以下是访谈的逐字稿：",
+        "transcript": "生成访谈的逐字稿。区分不同发言人很重要。格式为 '发言人: 内容'。",
+        "summary": """
         提供访谈的全面总结。包括：
         1. **执行摘要**：高层次概述（约100字）
         2. **关键要点**：讨论的主要议题（要点列表）
         3. **行动事项/结论**：提到的任何决定或后续步骤
         4. **详细笔记**：内容的结构化分解
-        """
-        mind_map_prompt = """
+        """,
+        "mind_map": """
         使用 Mermaid.js 语法创建访谈内容的思维导图。
         注重主题和子主题的层级结构。
         
@@ -97,22 +130,25 @@ def analyze_interview(file_path, language="zh"):
               要点B
             话题2
               要点C
-        """
-    else:
-        base_instruction = """
+        """,
+    }),
+    "en": MappingProxyType({
+        "base": """
         You are an expert Interview Analyst acting as a professional secretary.
         Your task is to analyze the provided interview recording/image.
-        """
-        transcript_prompt = "Generate a verbatim transcript of this interview. Speaker distinction is important. Format as 'Speaker: Text'."
-        summary_prompt = """
+        """,
+        "batch": "Complete each task below in a single response. Return a JSON object with one field per task (named in brackets) holding that task's full output.",
+        "transcript_context": "The interview transcript follows:",
+        "transcript": "Generate a verbatim transcript of this interview. Speaker distinction is important. Format as 'Speaker: Text'.",
+        "summary": """
         Provide a comprehensive summary of the interview.
         Include:
         1. **Executive Summary**: A high-level overview (100 words).
         2. **Key Topics**: Bullet points of main subjects discussed.
         3. **Action Items/Conclusions**: Any decisions or next steps mentioned.
         4. **Detailed Notes**: A structured breakdown of the content.
-        """
-        mind_map_prompt = """
+        """,
+        "mind_map": """
         Create a Mind Map of the interview content using Mermaid.js syntax.
         Focus on the hierarchy of topics and subtopics.
         
@@ -126,64 +162,639 @@ def analyze_interview(file_path, language="zh"):
               Subpoint B
             Topic 2
               Subpoint C
-        """
+        """,
+    }),
+})
+
+def configure_gemini(api_key=None):
+    """配置 Gemini API / Configure Gemini API."""
+    key = api_key or os.getenv("GEMINI_API_KEY")
+    if not key:
+        logger.error("No API key provided.")
+        raise ValueError("Gemini API Key is required. / 需要提供 Gemini API 密钥。")
+    genai.configure(api_key=key)
+    # Models bind their client lazily; never reuse one built under another key
+    get_model.cache_clear()
+
+@functools.lru_cache(maxsize=None)
+def get_model(model_name=MODEL_NAME):
+    """获取复用的 GenerativeModel 实例 / Return a shared GenerativeModel instance for the model name."""
+    return genai.GenerativeModel(model_name=model_name)
+
+def compress_media(file_path, mime_type):
+    """
+    上传前将音视频压缩为单声道 16kHz Opus / Re-encode audio/video to mono 16 kHz Opus before upload.
     
-    # -- Transcript --
-    logger.info("Generating transcript...")
-    response = model.generate_content([uploaded_file, base_instruction, transcript_prompt])
-    results["transcript"] = response.text
+    Args:
+        file_path (str): 本地文件路径 / Path to the local file
+        mime_type (str): 文件 MIME 类型 / MIME type of the file
         
-    # -- Summary --
-    logger.info("Generating summary...")
-    response = model.generate_content([uploaded_file, base_instruction, summary_prompt])
-    results["summary"] = response.text
+    Returns:
+        str: 压缩后的文件路径；无需压缩、未安装 ffmpeg 或压缩失败时返回原路径
+    """
+    if not mime_type.startswith(("audio", "video")) or shutil.which("ffmpeg") is None:
+        return file_path
+    
+    output_path = f"{os.path.splitext(file_path)[0]}.speech.ogg"
+    command = ["ffmpeg", "-y", "-loglevel", "error", "-i", file_path, *COMPRESS_AUDIO_ARGS, output_path]
+    try:
+        logger.info(f"Compressing media: {file_path}")
+        subprocess.run(command, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        logger.warning(f"ffmpeg compression failed, uploading original: {e.stderr.decode(errors='replace').strip()}")
+        if os.path.exists(output_path):
+            os.unlink(output_path)
+        return file_path
+    
+    original_size, compressed_size = os.path.getsize(file_path), os.path.getsize(output_path)
+    if compressed_size >= original_size:
+        os.unlink(output_path)
+        return file_path
+    logger.info(f"Compressed {original_size} -> {compressed_size} bytes")
+    return output_path
+
+def poll_interval(attempt):
+    """第 attempt 次轮询前的等待时间 / Delay before the given poll attempt (exponential backoff)."""
+    return min(POLL_INITIAL_INTERVAL * POLL_BACKOFF ** attempt, POLL_MAX_INTERVAL)
+
+def start_upload(file_path):
+    """在上传并发上限内上传文件 / Upload a file, waiting for a free slot under MAX_INFLIGHT_UPLOADS."""
+    with UPLOAD_SLOTS:
+        return genai.upload_file(file_path)
+
+def upload_file_to_gemini(file_path):
+    """上传文件到 Gemini File API / Upload file to Gemini File API."""
+    try:
+        logger.info(f"Uploading file: {file_path}")
+        file_upload = start_upload(file_path)
+        logger.info(f"File uploaded. URI: {file_upload.uri}")
         
-    # -- Mind Map --
-    logger.info("Generating mind map...")
-    response = model.generate_content([uploaded_file, base_instruction, mind_map_prompt])
-    # Clean up code blocks
-    text = response.text
-    if "```mermaid" in text:
-        text = text.split("```mermaid")[1].split("```")[0].strip()
-    elif "```" in text:
-        text = text.split("```")[1].strip()
-    results["mind_map"] = text
+        # Poll for processing completion
+        deadline = time.monotonic() + MAX_POLL_SECONDS
+        attempt = 0
+        while file_upload.state.name == "PROCESSING":
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"File processing did not finish within {MAX_POLL_SECONDS}s. / 文件处理超时。")
+            logger.info("File is processing...")
+            time.sleep(poll_interval(attempt))
+            attempt += 1
+            file_upload = genai.get_file(file_upload.name)
+            
+        if file_upload.state.name == "FAILED":
+            logger.error("File processing failed.")
+            raise RuntimeError("Gemini File API processing failed. / 文件处理失败。")
+            
+        logger.info(f"File ready. State: {file_upload.state.name}")
+        return file_upload
+    except Exception as e:
+        logger.error(f"Error uploading file: {e}")
+        raise
+
+def generate_with_retry(model, contents, **kwargs):
+    """调用 generate_content，遇到限流/服务端错误时指数退避重试 / Call generate_content with exponential backoff on 429/5xx."""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return model.generate_content(contents, **kwargs)
+        except RETRYABLE_ERRORS as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = RETRY_BASE_DELAY * (2 ** attempt)
+            logger.warning(f"Transient API error ({e.__class__.__name__}), retrying in {delay:.0f}s...")
+            time.sleep(delay)
+
+def generate_text(model, contents, on_text=None, **kwargs):
+    """
+    生成文本；提供 on_text 时流式返回累计文本 / Generate text, streaming accumulated text to on_text if given.
     
-    return results
+    Returns:
+        str: 完整响应文本 / Full response text
+    """
+    if on_text is None:
+        return generate_with_retry(model, contents, **kwargs).text
+    text = ""
+    response = generate_with_retry(model, contents, stream=True, **kwargs)
+    for chunk in response:
+        if chunk.parts:
+            text += chunk.text
+            on_text(text)
+    
+    # Same contract as response.text: blocked / empty responses raise ValueError instead of returning ""
+    finish_reason = response.candidates[0].finish_reason if response.candidates else None
+    if not text or finish_reason not in STREAM_OK_FINISH_REASONS:
+        reason = finish_reason.name if finish_reason is not None else f"no candidates ({response.prompt_feedback})"
+        raise ValueError(f"Streamed response ended without usable text: {reason}. / 响应被拦截或为空。")
+    return text
 
-def generate_report(results, filename="interview_report"):
+def partial_json_strings(raw, keys):
     """
-    生成 Markdown 格式的完整报告 / Generate full Markdown report.
+    从流式传输中的 JSON 文本提取已收到的字符串字段 / Extract string fields received so far from partial JSON.
+    
+    Returns:
+        dict: 字段名到（可能不完整的）字符串值 / Mapping of field name to its (possibly partial) value
+    """
+    fields = {}
+    for key in keys:
+        start = re.search(rf'"{re.escape(key)}"\s*:\s*"', raw)
+        if not start:
+            continue
+        body = JSON_STRING_BODY_RE.match(raw, start.end()).group(0)
+        # Drop a \uXXXX escape cut off mid-stream
+        body = re.sub(r"\\u[0-9a-fA-F]{0,3}$", "", body)
+        try:
+            fields[key] = json.loads(f'"{body}"')
+        except ValueError:
+            pass
+    return fields
+
+def pump_progress(events, futures, on_progress):
+    """
+    在调用线程中转发工作线程的进度 / Forward worker progress to on_progress on the calling thread.
+    
+    Only the latest text per key is forwarded, so a slow UI never falls behind the stream.
+    """
+    while True:
+        done = all(future.done() for future in futures)
+        latest = {}
+        try:
+            key, text = events.get(timeout=0.1)
+            latest[key] = text
+            while True:
+                key, text = events.get_nowait()
+                latest[key] = text
+        except queue.Empty:
+            pass
+        for key, text in latest.items():
+            on_progress(key, text)
+        if done:
+            return
+
+def create_shared_context(file_handle, base_instruction, model_name=MODEL_NAME):
+    """
+    创建多个提示共享的上下文 / Build the context shared by all prompts on one file.
+    
+    媒体文件与基础指令通过 Gemini 上下文缓存只处理一次；文件过小无法缓存时，
+    回退为每次请求携带相同前缀。
     
     Args:
-        results (dict): analyze_interview 的返回结果
-        filename (str): 报告文件名（不含扩展名）
+        file_handle: File API 文件对象或内联数据 / File API handle or inline data part
+        base_instruction (str): 系统指令 / System instruction
+        model_name (str): 模型名称 / Model name
         
     Returns:
-        str: Markdown 格式的报告内容
+        tuple: (model, prefix, cached_content) — cached_content is None on fallback
     """
-    report = f"""# 📋 访谈分析报告 / Interview Analysis Report
+    try:
+        cached_content = caching.CachedContent.create(
+            model=model_name,
+            system_instruction=base_instruction,
+            contents=[file_handle],
+            ttl=CONTEXT_CACHE_TTL,
+        )
+        logger.info(f"Context cache created: {cached_content.name}")
+        return genai.GenerativeModel.from_cached_content(cached_content=cached_content), [], cached_content
+    except google_exceptions.GoogleAPICallError as e:
+        logger.info(f"Context caching unavailable ({e.__class__.__name__}), sending full prefix per prompt.")
+        return get_model(model_name), [file_handle, base_instruction], None
 
-## 📝 访谈纪要 / Summary
+def generate_separately(uploaded_file, base_instruction, prompts, model_name=MODEL_NAME, on_progress=None):
+    """
+    每个提示单独调用并发执行 / Run one concurrent generate_content call per prompt.
+    
+    两个及以上提示时共享上下文缓存；单个提示直接调用 / Prompts share a context cache only when there are two or more.
+    
+    on_progress(key, text) 在调用线程中接收各输出的累计文本 / receives accumulated text on the calling thread.
+    
+    Returns:
+        dict: 提示键到响应文本的映射 / Mapping of prompt key to response text
+    """
+    if len(prompts) == 1:
+        # Nothing to share: a context cache would only add create/delete round trips and storage
+        [(key, prompt)] = prompts.items()
+        on_text = (lambda text: on_progress(key, text)) if on_progress else None
+        return {key: generate_text(get_model(model_name), [uploaded_file, base_instruction, prompt], on_text)}
+    
+    model, prefix, cached_content = create_shared_context(uploaded_file, base_instruction, model_name=model_name)
+    events = queue.Queue()
+    
+    def generate(key, prompt):
+        on_text = (lambda text: events.put((key, text))) if on_progress else None
+        return generate_text(model, prefix + [prompt], on_text)
+    
+    try:
+        with ThreadPoolExecutor(max_workers=len(prompts)) as executor:
+            futures = {key: executor.submit(generate, key, prompt) for key, prompt in prompts.items()}
+            if on_progress:
+                pump_progress(events, futures.values(), on_progress)
+            wait(futures.values())
+    finally:
+        # Release the context cache early instead of paying storage until TTL
+        if cached_content is not None:
+            try:
+                cached_content.delete()
+            except google_exceptions.GoogleAPICallError as e:
+                logger.warning(f"Failed to delete context cache: {e}")
+    
+    return {key: future.result() for key, future in futures.items()}
 
-{results.get("summary", "无摘要 / No summary")}
+def generate_batched(uploaded_file, base_instruction, prompts, batch_instruction, model_name=MODEL_NAME, on_progress=None):
+    """
+    单次调用返回全部输出的 JSON / Generate all outputs in one call returning structured JSON.
+    
+    Returns:
+        dict: 提示键到响应文本的映射 / Mapping of prompt key to response text
+    """
+    combined_prompt = "\n\n".join(
+        [batch_instruction] + [f"[{key}]\n{prompt}" for key, prompt in prompts.items()]
+    )
+    
+    streamed = {}
+    
+    def on_text(raw):
+        for key, text in partial_json_strings(raw, prompts).items():
+            if streamed.get(key) != text:
+                streamed[key] = text
+                on_progress(key, text)
+    
+    text = generate_text(
+        get_model(model_name),
+        [uploaded_file, base_instruction, combined_prompt],
+        on_text if on_progress else None,
+        generation_config=genai.GenerationConfig(
+            response_mime_type="application/json",
+            response_schema={
+                "type": "object",
+                "properties": {key: {"type": "string"} for key in prompts},
+                "required": list(prompts),
+            },
+        ),
+    )
+    data = json.loads(text)
+    return {key: data[key] for key in prompts}
 
----
+def build_prompts(language="zh"):
+    """
+    获取指定语言的提示词 / Return the (read-only) prompts for the given output language.
+    
+    Returns:
+        Mapping: 只读映射，包含 'base', 'batch', 'transcript_context', 'transcript', 'summary', 'mind_map'
+    """
+    return PROMPTS["zh"] if language == "zh" else PROMPTS["en"]
 
-## 🗺️ 信息框图 / Mind Map
+def generate_outputs(uploaded_file, base_instruction, prompts, batch_instruction, batched=None, model_name=MODEL_NAME,
+                     on_progress=None):
+    """
+    按 BATCH_PROMPTS 选择单次或多次调用生成输出 / Generate outputs with one batched call or separate calls.
+    
+    Returns:
+        dict: 提示键到响应文本的映射 / Mapping of prompt key to response text
+    """
+    if batched is None:
+        batched = BATCH_PROMPTS
+    # A single prompt gains nothing from the JSON wrapper
+    if not batched or len(prompts) == 1:
+        return generate_separately(uploaded_file, base_instruction, prompts, model_name=model_name, on_progress=on_progress)
+    try:
+        return generate_batched(
+            uploaded_file, base_instruction, prompts, batch_instruction, model_name=model_name, on_progress=on_progress
+        )
+    except (json.JSONDecodeError, KeyError) as e:
+        # Malformed or truncated JSON (e.g. very long transcripts): fall back to separate calls.
+        # Blocked / empty responses (ValueError, BlockedPromptException) propagate, since
+        # retrying the same media prompt by prompt would most likely be blocked as well.
+        logger.warning(f"Batched response unusable ({e.__class__.__name__}), retrying with separate prompts.")
+        return generate_separately(uploaded_file, base_instruction, prompts, model_name=model_name, on_progress=on_progress)
 
-```mermaid
-{results.get("mind_map", "mindmap\\n  root((No Data))")}
-```
+def clean_mind_map(text):
+    """去除 Mermaid 代码块标记 / Strip Mermaid code fences."""
+    match = MERMAID_FENCE_RE.search(text)
+    return match.group(1).strip() if match else text.strip()
 
----
+def finish_outputs(texts):
+    """整理生成的原始文本 / Post-process raw generated texts (strip Mermaid fences)."""
+    if "mind_map" in texts:
+        texts["mind_map"] = clean_mind_map(texts["mind_map"])
+    return texts
 
-## 📜 访谈正文 / Transcript
+def get_media_duration(file_path):
+    """用 ffprobe 读取媒体时长（秒），失败时返回 None / Media duration in seconds via ffprobe, or None."""
+    if shutil.which("ffprobe") is None:
+        return None
+    command = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", file_path]
+    try:
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        return float(output.strip())
+    except (subprocess.CalledProcessError, ValueError):
+        return None
 
-{results.get("transcript", "无转录 / No transcript")}
+def merge_transcripts(parts, window=5):
+    """
+    拼接分段转录并去除重叠部分的重复行 / Join chunk transcripts, dropping lines repeated across the overlap.
+    
+    只去掉片段开头连续出现在上一片段结尾的行，遇到第一条新行即停止，避免误删“对/好的”等短回复之后的内容。
+    各片段独立标注发言人，相邻片段中的“发言人1”不一定是同一个人。
+    Only the leading run of lines already present at the previous tail is dropped. Speaker labels
+    are assigned per chunk, so "Speaker 1" may refer to different people in neighbouring chunks.
+    
+    Args:
+        parts (list): 按时间顺序排列的分段转录 / Chunk transcripts in time order
+        window (int): 在边界两侧比较的行数 / Lines compared on each side of a boundary
+        
+    Returns:
+        str: 合并后的转录 / Merged transcript
+    """
+    def normalize(line):
+        return re.sub(r"\W+", "", line).lower()
+    
+    merged = []
+    for part in parts:
+        lines = [line for line in part.strip().splitlines() if line.strip()]
+        tail = {normalize(line) for line in merged[-window:]}
+        # Skip the head lines repeated from the previous tail, stopping at the first new one
+        cut = 0
+        while cut < min(window, len(lines)) and normalize(lines[cut]) in tail:
+            cut += 1
+        merged.extend(lines[cut:])
+    return "\n".join(merged)
 
----
+def chunk_starts(file_path, duration=None, chunk_seconds=CHUNK_SECONDS):
+    """长音视频各片段的起始秒数 / Start offsets (seconds) of the overlapping chunks."""
+    duration = duration or get_media_duration(file_path)
+    if not duration:
+        raise RuntimeError("Unable to read media duration. / 无法读取媒体时长。")
+    # A trailing chunk shorter than the overlap is already covered by its predecessor
+    return [start for start in range(0, math.ceil(duration), chunk_seconds)
+            if start == 0 or start < duration - CHUNK_OVERLAP_SECONDS]
 
-*由访谈总结器自动生成 / Generated by Interview Summarizer*
-"""
-    return report
+def upload_chunk(file_path, workdir, index, start, chunk_seconds=CHUNK_SECONDS):
+    """用 ffmpeg 切出一个片段并上传 / Cut one chunk with ffmpeg and upload it to the File API."""
+    chunk_path = os.path.join(workdir, f"chunk_{index:03d}.ogg")
+    command = [
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-ss", str(start), "-t", str(chunk_seconds + CHUNK_OVERLAP_SECONDS),
+        "-i", file_path, *COMPRESS_AUDIO_ARGS, chunk_path,
+    ]
+    subprocess.run(command, check=True, capture_output=True)
+    return upload_file_to_gemini(chunk_path)
+
+def delete_files(files):
+    """从 File API 删除文件 / Delete files from the File API, logging failures."""
+    for file in files:
+        try:
+            genai.delete_file(file.name)
+        except google_exceptions.GoogleAPICallError as e:
+            logger.warning(f"Failed to delete {file.name}: {e}")
+
+def upload_chunks(file_path, duration=None, chunk_seconds=CHUNK_SECONDS, max_workers=MAX_CHUNK_WORKERS):
+    """
+    将长音视频切分为重叠片段并行上传，供多次转录复用 / Split long media into overlapping chunks and upload them in parallel.
+    
+    调用方负责缓存返回的文件对象，并在不再需要时用 delete_files 删除。
+    
+    Returns:
+        list: 按时间顺序排列的 File API 文件对象 / File API handles in time order
+    """
+    starts = chunk_starts(file_path, duration, chunk_seconds)
+    logger.info(f"Uploading {len(starts)} chunks of {chunk_seconds}s in parallel...")
+    with tempfile.TemporaryDirectory() as workdir:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(starts))) as executor:
+            futures = [
+                executor.submit(upload_chunk, file_path, workdir, i, start, chunk_seconds) for i, start in enumerate(starts)
+            ]
+            wait(futures)
+    failed = [future.exception() for future in futures if future.exception()]
+    if failed:
+        # Don't leave the chunks that did make it behind on the File API
+        delete_files([future.result() for future in futures if not future.exception()])
+        raise failed[0]
+    return [future.result() for future in futures]
+
+def transcribe_chunks(chunk_files, base_instruction, transcript_prompt, model_name=MODEL_NAME,
+                      max_workers=MAX_CHUNK_WORKERS):
+    """
+    并行转录已上传的片段并合并 / Transcribe uploaded chunks in parallel and merge the results.
+    
+    Returns:
+        str: 合并后的转录 / Merged transcript
+    """
+    model = get_model(model_name)
+    logger.info(f"Transcribing {len(chunk_files)} chunks in parallel...")
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunk_files))) as executor:
+        parts = list(executor.map(
+            lambda chunk_file: generate_with_retry(model, [chunk_file, base_instruction, transcript_prompt]).text,
+            chunk_files,
+        ))
+    return merge_transcripts(parts)
+
+def analyze_interview(file_path, language="zh", model_name=MODEL_NAME, on_progress=None, sections=OUTPUT_KEYS):
+    """
+    分析访谈内容 / Analyze interview content using Gemini.
+    
+    Args:
+        file_path (str): 本地文件路径 / Path to the local file
+        language (str): 输出语言 "zh" 或 "en" / Output language
+        model_name (str): Gemini 模型名称 / Gemini model name
+        on_progress (callable): 可选，on_progress(key, text) 接收流式累计文本 / Optional streaming callback
+        sections (tuple): 需要生成的输出，默认全部 / Outputs to generate, subset of OUTPUT_KEYS
+        
+    Returns:
+        dict: 所请求输出的字典 / Mapping of each requested section to its text
+    """
+    uploaded_file = upload_file_to_gemini(file_path)
+    return analyze_uploaded_file(
+        uploaded_file, language=language, model_name=model_name, on_progress=on_progress, sections=sections
+    )
+
+def analyze_interview_inline(data, mime_type, language="zh", model_name=MODEL_NAME, on_progress=None,
+                             sections=OUTPUT_KEYS):
+    """
+    以内联数据分析小文件，跳过 File API / Analyze a small file sent inline, skipping the File API.
+    
+    Args:
+        data (bytes): 文件内容 / File content, smaller than INLINE_MAX_BYTES
+        mime_type (str): 文件 MIME 类型 / MIME type of the file
+        language (str): 输出语言 "zh" 或 "en" / Output language
+        model_name (str): Gemini 模型名称 / Gemini model name
+        on_progress (callable): 可选，on_progress(key, text) 接收流式累计文本 / Optional streaming callback
+        sections (tuple): 需要生成的输出，默认全部 / Outputs to generate, subset of OUTPUT_KEYS
+        
+    Returns:
+        dict: 所请求输出的字典 / Mapping of each requested section to its text
+    """
+    if len(data) >= INLINE_MAX_BYTES:
+        raise ValueError(f"Inline data must be smaller than {INLINE_MAX_BYTES} bytes. / 内联文件过大。")
+    return analyze_uploaded_file(
+        {"mime_type": mime_type, "data": data},
+        language=language,
+        model_name=model_name,
+        on_progress=on_progress,
+        sections=sections,
+    )
+
+def analyze_uploaded_file(uploaded_file, language="zh", batched=None, model_name=MODEL_NAME, on_progress=None,
+                          sections=OUTPUT_KEYS):
+    """
+    分析已上传到 File API 的访谈文件 / Analyze a file already uploaded to the Gemini File API.
+    
+    Args:
+        uploaded_file: upload_file_to_gemini 返回的文件对象或内联数据 /
+            File handle returned by upload_file_to_gemini, or an inline {"mime_type": ..., "data": ...} part
+        language (str): 输出语言 "zh" 或 "en" / Output language
+        batched (bool): 是否合并为单次调用，默认读取 BATCH_PROMPTS / One combined call instead of three
+        model_name (str): Gemini 模型名称 / Gemini model name
+        on_progress (callable): 可选，on_progress(key, text) 接收流式累计文本 / Optional streaming callback
+        sections (tuple): 需要生成的输出，默认全部 / Outputs to generate, subset of OUTPUT_KEYS
+        
+    Returns:
+        dict: 所请求输出的字典 / Mapping of each requested section to its text
+    """
+    # 1. Construct Prompts (only the requested sections are generated)
+    p = build_prompts(language)
+    prompts = {key: p[key] for key in OUTPUT_KEYS if key in sections}
+    if not prompts:
+        raise ValueError(f"sections must include at least one of {OUTPUT_KEYS}. / 请至少选择一项输出。")
+    
+    # 2. Generate
+    logger.info(f"Generating {', '.join(prompts)}...")
+    texts = generate_outputs(
+        uploaded_file, p["base"], prompts, p["batch"], batched=batched, model_name=model_name, on_progress=on_progress
+    )
+    
+    return finish_outputs(texts)
+
+def analyze_long_interview(file_path, language="zh", batched=None, duration=None, model_name=MODEL_NAME,
+                           on_progress=None, sections=OUTPUT_KEYS, chunk_files=None, transcript=None):
+    """
+    分段并行转录长音视频后再生成纪要与框图 / Analyze long audio/video by transcribing chunks in parallel.
+    
+    Args:
+        file_path (str): 本地文件路径 / Path to the local file
+        language (str): 输出语言 "zh" 或 "en" / Output language
+        batched (bool): 纪要与框图是否合并为单次调用 / One combined call for summary and mind map
+        duration (float): 媒体时长（秒），为空时用 ffprobe 读取 / Media duration in seconds
+        model_name (str): Gemini 模型名称 / Gemini model name
+        on_progress (callable): 可选，on_progress(key, text) 接收流式累计文本 / Optional streaming callback
+        sections (tuple): 需要生成的输出，默认全部 / Outputs to generate, subset of OUTPUT_KEYS
+        chunk_files (list): 可选，upload_chunks 已上传的片段，避免重复切分上传 /
+            Optional chunks from upload_chunks, reused instead of cutting and uploading again
+        transcript (str): 可选，已有的逐字稿（如缓存结果），提供时跳过分段转录 /
+            Optional existing transcript (e.g. from the results cache); chunk transcription is skipped
+        
+    Returns:
+        dict: 所请求输出的字典；逐字稿总会生成，因此总会包含 / Requested sections, plus the transcript
+            (always produced here, since the other outputs are derived from it)
+    """
+    p = build_prompts(language)
+    if transcript:
+        logger.info("Reusing existing transcript, skipping chunk transcription.")
+    elif chunk_files:
+        transcript = transcribe_chunks(chunk_files, p["base"], p["transcript"], model_name=model_name)
+    else:
+        # One-off chunks: nothing will reuse them, so don't leave them on the File API
+        chunk_files = upload_chunks(file_path, duration=duration)
+        try:
+            transcript = transcribe_chunks(chunk_files, p["base"], p["transcript"], model_name=model_name)
+        finally:
+            delete_files(chunk_files)
+    if on_progress:
+        on_progress("transcript", transcript)
+    
+    prompts = {key: p[key] for key in ("summary", "mind_map") if key in sections}
+    if not prompts:
+        return {"transcript": transcript}
+    
+    # Summary and mind map only need the (cheap, text-only) transcript
+    logger.info(f"Generating {', '.join(prompts)} from transcript...")
+    source = f"{p['transcript_context']}\n\n{transcript}"
+    texts = generate_outputs(
+        source, p["base"], prompts, p["batch"], batched=batched, model_name=model_name, on_progress=on_progress
+    )
+    
+    return {"transcript": transcript, **finish_outputs(texts)}
+
+def results_cache_path(file_sha256, language, model_name=MODEL_NAME):
+    """结果缓存文件路径 / Path of the on-disk results cache entry."""
+    return os.path.join(RESULTS_CACHE_DIR, f"{file_sha256}_{language}_{model_name}.json")
+
+def load_cached_results(file_sha256, language, model_name=MODEL_NAME):
+    """
+    读取磁盘缓存的分析结果 / Load analysis results from the on-disk cache.
+    
+    Returns:
+        dict | None: 命中时返回非空输出，否则返回 None / Non-empty cached outputs, or None on a miss
+    """
+    cache_path = results_cache_path(file_sha256, language, model_name)
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            results = json.load(f)
+        # Bump mtime so eviction removes the least recently used entries
+        os.utime(cache_path)
+    except FileNotFoundError:
+        # Missing, or evicted by another session between the read and the utime
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable cache entry {cache_path}: {e}")
+        return None
+    # Empty outputs (e.g. from entries written before they were filtered) count as missing
+    results = {key: text for key, text in results.items() if text}
+    if not results:
+        return None
+    logger.info(f"Results cache hit: {cache_path}")
+    return results
+
+def save_cached_results(file_sha256, language, results, model_name=MODEL_NAME):
+    """写入磁盘缓存并淘汰最久未使用的条目 / Save results to disk and evict least recently used entries."""
+    # Never persist empty outputs; they would be served to every later session
+    results = {key: text for key, text in results.items() if text}
+    if not results:
+        return
+    os.makedirs(RESULTS_CACHE_DIR, exist_ok=True)
+    cache_path = results_cache_path(file_sha256, language, model_name)
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
+    
+    entries = [os.path.join(RESULTS_CACHE_DIR, name) for name in os.listdir(RESULTS_CACHE_DIR) if name.endswith(".json")]
+    if len(entries) > RESULTS_CACHE_MAX_ENTRIES:
+        entries.sort(key=os.path.getmtime)
+        for path in entries[:len(entries) - RESULTS_CACHE_MAX_ENTRIES]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+def generate_report(results, filename="interview_report"):
+    """
+    生成 Markdown 格式的完整报告 / Generate full Markdown report.
+    
+    Args:
+        results (dict): analyze_interview 的返回结果
+        filename (str): 报告文件名（不含扩展名）
+        
+    Returns:
+        str: Markdown 格式的报告内容
+    """
+    # Join the pieces once rather than formatting (possibly MB-sized) transcripts into a template;
+    # sections that were not generated are left out
+    parts = ["# 📋 访谈分析报告 / Interview Analysis Report\n\n"]
+    if "summary" in results:
+        parts += [
+            "## 📝 访谈纪要 / Summary\n\n",
+            results["summary"] or "无摘要 / No summary",
+            "\n\n---\n\n",
+        ]
+    if "mind_map" in results:
+        parts += [
+            "## 🗺️ 信息框图 / Mind Map\n\n",
+            "```mermaid\n",
+            results["mind_map"] or "mindmap\n  root((No Data))",
+            "\n```\n\n---\n\n",
+        ]
+    if "transcript" in results:
+        parts += [
+            "## 📜 访谈正文 / Transcript\n\n",
+            results["transcript"] or "无转录 / No transcript",
+            "\n\n---\n\n",
+        ]
+    parts.append("*由访谈总结器自动生成 / Generated by Interview Summarizer*\n")
+    return "".join(parts)